@@ -14,6 +14,8 @@ def create_schema(conn):
     cur = conn.cursor()
     cur.executescript(
         """
+        -- sensitivity_results is created on demand by src/sensitivity.py
+        DROP TABLE IF EXISTS sensitivity_results;
         DROP TABLE IF EXISTS proforma_results;
         DROP TABLE IF EXISTS financing;
         DROP TABLE IF EXISTS projects;
@@ -10,6 +10,7 @@ Examples:
 
 import argparse
 
+from .database import get_engine
 from .model import run_project_model
 from .report import write_markdown_summary
 from .sensitivity import run_sensitivity
@@ -79,17 +80,19 @@ def main():
         run_sensitivity(args.project_id)
 
     elif args.command == "all":
-        # 1) run model
-        print(f"[all] Running model for project {args.project_id}...")
-        run_project_model(args.project_id)
-
-        # 2) generate summary
-        print(f"[all] Generating summary for project {args.project_id}...")
-        write_markdown_summary(args.project_id)
-
-        # 3) run sensitivity
-        print(f"[all] Running sensitivity for project {args.project_id}...")
-        run_sensitivity(args.project_id)
+        # One connection shared by every step of the pipeline
+        with get_engine().connect() as conn:
+            # 1) run model
+            print(f"[all] Running model for project {args.project_id}...")
+            run_project_model(args.project_id, conn=conn)
+
+            # 2) generate summary
+            print(f"[all] Generating summary for project {args.project_id}...")
+            write_markdown_summary(args.project_id, conn=conn)
+
+            # 3) run sensitivity
+            print(f"[all] Running sensitivity for project {args.project_id}...")
+            run_sensitivity(args.project_id, conn=conn)
 
         print(f"[all] Completed full pipeline for project {args.project_id}.")
 
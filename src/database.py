@@ -5,21 +5,40 @@ This module centralizes how the application connects to the database so that
 moving from SQLite to Postgres (e.g., AWS RDS) is just a config change.
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, Engine
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 import os
 import yaml
 
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as _YamlLoader
+
+# One engine (and connection pool) per database URL for the process lifetime.
+_engines: dict[str, Engine] = {}
+
+
+@lru_cache(maxsize=4)
+def _load_config_cached(cfg_path: Path, mtime: float):
+    with cfg_path.open("r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
 
 def load_config():
     """
     Load configuration from config/settings.yaml if present.
+
+    The parsed result is cached per file modification time, so repeated calls
+    are cheap and edits to the file are still picked up. Treat it as read-only.
     """
     root = Path(__file__).resolve().parents[1]
     cfg_path = root / "config" / "settings.yaml"
     if cfg_path.exists():
-        with cfg_path.open("r", encoding="utf-8") as f:
-            return yaml.safe_load(f)
+        return _load_config_cached(cfg_path, cfg_path.stat().st_mtime)
     return {}
 
 
@@ -46,9 +65,12 @@ def get_default_db_url() -> str:
     return f"sqlite:///{db_path}"
 
 
-def get_engine(db_url: str | None = None):
+def get_engine(db_url: str | None = None) -> Engine:
     """
-    Create and return an SQLAlchemy engine.
+    Return a shared SQLAlchemy engine, creating it on first use.
+
+    Engines are cached per URL so the model, report, and sensitivity steps
+    reuse one connection pool.
 
     Parameters
     ----------
@@ -56,4 +78,58 @@ def get_engine(db_url: str | None = None):
         If provided, use this URL; otherwise use the default.
     """
     url = db_url or get_default_db_url()
-    return create_engine(url, future=True)
+    engine = _engines.get(url)
+    if engine is None:
+        engine = create_engine(url, future=True)
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", _set_sqlite_pragmas)
+        _engines[url] = engine
+    return engine
+
+
+@lru_cache(maxsize=32)
+def _by_project_id_statement(sql_template: str, qmark: bool):
+    if qmark:
+        return sql_template.format(pid="?")
+    return text(sql_template.format(pid=":pid"))
+
+
+def execute_by_project_id(conn: Connection, sql_template: str, project_id: int):
+    """
+    Run a statement whose only bind parameter, ``project_id``, is marked
+    ``{pid}`` in ``sql_template``.
+
+    On qmark drivers (sqlite3) the SQL goes straight to the DBAPI through
+    exec_driver_sql, skipping SQLAlchemy's bind-parameter compilation. Other
+    drivers (e.g. psycopg2) go through text() with a named parameter, so
+    SQLAlchemy handles their placeholder and escaping rules.
+    """
+    qmark = conn.dialect.paramstyle == "qmark"
+    stmt = _by_project_id_statement(sql_template, qmark)
+    if qmark:
+        return conn.exec_driver_sql(stmt, (project_id,))
+    return conn.execute(stmt, {"pid": project_id})
+
+
+@contextmanager
+def connection_scope(conn: Connection | None = None):
+    """
+    Yield ``conn`` if given; otherwise open a connection on the default engine
+    and close it on exit. Lets pipeline steps share one caller-owned connection.
+    """
+    if conn is not None:
+        yield conn
+        return
+    with get_engine().connect() as owned:
+        yield owned
+
+
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    """
+    Use WAL journaling with relaxed fsync so bulk result writes are cheap.
+    """
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.close()
@@ -7,140 +7,163 @@ finance model, and stores results in the proforma_results table.
 
 import argparse
 from datetime import datetime
-from math import isclose
+from math import expm1, isnan, log1p
 from typing import Dict, Any
 
+import numpy as np
 from sqlalchemy import text
 
-from .database import get_engine, load_config
+from .database import connection_scope, execute_by_project_id, load_config
 
 
-def npv(rate: float, cashflows: list[float]) -> float:
-    return sum(cf / ((1 + rate) ** t) for t, cf in enumerate(cashflows))
+def npv_vec(rate: float, cf_array: np.ndarray) -> float:
+    """
+    NPV of a cashflow array indexed from t = 0; no input conversion.
+    """
+    discounts = (1 + rate) ** -np.arange(len(cf_array))
+    return float(cf_array @ discounts)
+
+
+def npv(rate: float, cashflows) -> float:
+    return npv_vec(rate, np.asarray(cashflows, dtype=float))
 
 
-def irr(cashflows: list[float], guess: float = 0.08, tol: float = 1e-6, maxiter: int = 200) -> float:
+def irr(cashflows, guess: float = 0.08) -> float:
     """
-    Simple Newton-Raphson IRR solver.
+    IRR as a polynomial root.
+
+    With y = 1 + r, (1 + r)**n * NPV(r) is a degree-n polynomial in y whose
+    coefficients are the cashflows in time order, so every IRR is a real,
+    positive root of that polynomial. A conventional levered cashflow (one
+    sign change) has exactly one; otherwise the root closest to ``guess`` is
+    returned. Returns NaN when no IRR exists.
     """
-    r = guess
-    for _ in range(maxiter):
-        npv_val = sum(cf / ((1 + r) ** t) for t, cf in enumerate(cashflows))
-        d_npv = sum(-t * cf / ((1 + r) ** (t + 1)) for t, cf in enumerate(cashflows))
-        if isclose(d_npv, 0.0, abs_tol=1e-12):
-            break
-        new_r = r - npv_val / d_npv
-        if abs(new_r - r) < tol:
-            return new_r
-        r = new_r
-    return r
+    cf = np.asarray(cashflows, dtype=float)
+    roots = np.roots(cf)
+    real = roots[np.isclose(roots.imag, 0.0, atol=1e-10)].real
+    candidates = real[real > 0] - 1.0
+    if candidates.size == 0:
+        return float("nan")
+    return float(candidates[np.argmin(np.abs(candidates - guess))])
 
 
-def loan_schedule(principal: float, rate: float, term_years: int):
+def annuity_factor(rate: float, term_years: int) -> float:
+    """
+    Level annual payment per unit of principal for an amortizing loan.
+    """
+    if rate != 0:
+        # (1 + rate)**n - 1 via expm1/log1p stays accurate at very small rates.
+        growth_m1 = expm1(term_years * log1p(rate))
+        return rate * (1 + growth_m1) / growth_m1
+    return 1.0 / term_years
+
+
+def loan_schedule(principal: float, rate: float, term_years: int) -> Dict[str, Any]:
     """
     Simple annual amortizing loan schedule.
+
+    Returns the level ``payment`` and ``term_years`` as scalars and the
+    per-year ``year``, ``interest``, ``principal``, and closing ``balance``
+    as NumPy arrays (index 0 = year 1).
     """
     term_years = int(term_years)
-    balance = principal
+    payment = principal * annuity_factor(rate, term_years)
 
+    k = np.arange(term_years + 1)
     if rate != 0:
-        annuity_factor = (rate * (1 + rate) ** term_years) / ((1 + rate) ** term_years - 1)
-        payment = principal * annuity_factor
+        growth_m1 = np.expm1(k * np.log1p(rate))
+        balances = principal * (1 + growth_m1) - payment * growth_m1 / rate
     else:
-        payment = principal / term_years
-
-    schedule = []
-    for year in range(1, term_years + 1):
-        interest = balance * rate
-        principal_paid = payment - interest
-        balance = max(balance - principal_paid, 0.0)
-        schedule.append(
-            {
-                "year": year,
-                "payment": payment,
-                "interest": interest,
-                "principal": principal_paid,
-                "balance": balance,
-            }
-        )
-    return schedule
+        balances = principal - payment * k
+    balances = np.maximum(balances, 0.0)
+
+    interest = balances[:-1] * rate
+    return {
+        "payment": payment,
+        "term_years": term_years,
+        "year": k[1:],
+        "interest": interest,
+        "principal": payment - interest,
+        "balance": balances[1:],
+    }
 
 
-def compute_project_finance(
+def precompute_invariants(
     proj: Dict[str, Any],
     fin: Dict[str, Any],
-    discount_rate: float,
-    tax_rate: float,
     years: int,
     opex_escalation: float,
 ) -> Dict[str, Any]:
     """
-    Core financial logic separated from I/O so it can be reused (sensitivity, APIs, etc.).
+    Precompute the parts of the proforma that do not depend on PPA price,
+    capex, or leverage, so scenarios only rescale these arrays.
     """
-    capacity_mw = proj["capacity_mw"]
-    cf_year1 = proj["cf_year1"]
+    # Base-year production (MWh)
+    energy_mwh_year1 = proj["capacity_mw"] * proj["cf_year1"] * 8760.0
     degradation = float(proj["degradation_pct"])
-    ppa_price = proj["ppa_price"]  # USD/kWh
-    capex = proj["capex"]
-    opex_annual = proj["opex_annual"]
 
-    # Base-year production (MWh)
-    energy_mwh_year1 = capacity_mw * cf_year1 * 8760.0
+    # Index t = 0 corresponds to operating year 1.
+    t = np.arange(years)
+    degradation_factor = (1 - degradation) ** t
+    opex_factor = (1 + opex_escalation) ** t
 
-    # Capital structure
-    debt_pct = fin["debt_pct"]
-    debt_principal = capex * debt_pct
-    equity = capex - debt_principal
+    # Debt service scales linearly with principal, so keep a unit-principal schedule.
+    unit_loan = loan_schedule(1.0, fin["interest_rate"], fin["term_years"])
+    loan_years = np.zeros(years)
+    loan_years[: min(unit_loan["term_years"], years)] = 1.0
 
-    loan = loan_schedule(debt_principal, fin["interest_rate"], fin["term_years"])
+    return {
+        "years": years,
+        "energy_mwh_year1": energy_mwh_year1,
+        "degradation_factor": degradation_factor,
+        # Revenue per USD/kWh of PPA price
+        "revenue_per_ppa": energy_mwh_year1 * degradation_factor * 1000.0,
+        "opex_factor": opex_factor,
+        "opex": proj["opex_annual"] * opex_factor,
+        "loan_years": loan_years,
+        "annuity_factor": unit_loan["payment"],
+    }
 
-    cashflows = []
-    revenues = []
-    opex_list = []
-    debt_service = []
 
-    for year in range(1, years + 1):
-        production_mwh = energy_mwh_year1 * ((1 - degradation) ** (year - 1))
-        revenue = production_mwh * 1000.0 * ppa_price
+def eval_scenario(
+    ppa_price: float,
+    capex: float,
+    debt_pct: float,
+    inv: Dict[str, Any],
+    discount_rate: float,
+    tax_rate: float,
+) -> Dict[str, Any]:
+    """
+    Evaluate one PPA price / capex / leverage case against precomputed invariants.
+    """
+    # Capital structure
+    debt_principal = capex * debt_pct
+    equity = capex - debt_principal
 
-        opex_y = opex_annual * ((1 + opex_escalation) ** (year - 1))
+    revenues = inv["revenue_per_ppa"] * ppa_price
+    opex_arr = inv["opex"]
+    debt_service = inv["loan_years"] * (debt_principal * inv["annuity_factor"])
 
-        ds = loan[year - 1]["payment"] if year <= len(loan) else 0.0
+    depreciation = capex / inv["years"]
 
-        depreciation = capex / years
+    taxable_income = revenues - opex_arr - depreciation - debt_service
+    tax = np.maximum(taxable_income * tax_rate, 0.0)
 
-        taxable_income = revenue - opex_y - depreciation - ds
-        tax = max(taxable_income * tax_rate, 0.0)
+    cashflows = revenues - opex_arr - debt_service - tax + depreciation
 
-        after_tax_cf = revenue - opex_y - ds - tax + depreciation
+    series = np.concatenate(([-equity], cashflows))
 
-        cashflows.append(after_tax_cf)
-        revenues.append(revenue)
-        opex_list.append(opex_y)
-        debt_service.append(ds)
+    irr_val = irr(series, guess=0.08)
+    npv_val = npv_vec(discount_rate, series)
 
-    series = [-equity] + cashflows
+    # Payback: first operating year with positive cumulative cashflow
+    cumulative = np.cumsum(cashflows)
+    pos = int(np.argmax(cumulative > 0))
+    payback_year = pos + 1 if cumulative[pos] > 0 else None
 
-    irr_val = irr(series, guess=0.08)
-    npv_val = npv(discount_rate, series)
-
-    # Payback
-    cumulative = 0.0
-    payback_year = None
-    for idx, cf in enumerate(series[1:], start=1):
-        cumulative += cf
-        if cumulative > 0:
-            payback_year = idx
-            break
-
-    dscr_values = []
-    for i, ds in enumerate(debt_service):
-        if ds <= 0:
-            continue
-        ebitda = revenues[i] - opex_list[i]
-        dscr_values.append(ebitda / ds)
-
-    min_dscr = min(dscr_values) if dscr_values else None
+    # DSCR over years with debt service
+    mask = debt_service > 0
+    min_dscr = float(((revenues[mask] - opex_arr[mask]) / debt_service[mask]).min()) if mask.any() else None
 
     return {
         "irr": irr_val,
@@ -150,9 +173,71 @@ def compute_project_finance(
     }
 
 
-def run_project_model(project_id: int) -> Dict[str, Any]:
+def compute_project_finance(
+    proj: Dict[str, Any],
+    fin: Dict[str, Any],
+    discount_rate: float,
+    tax_rate: float,
+    years: int,
+    opex_escalation: float,
+) -> Dict[str, Any]:
+    """
+    Core financial logic separated from I/O so it can be reused (sensitivity, APIs, etc.).
+    """
+    inv = precompute_invariants(proj, fin, years, opex_escalation)
+    return eval_scenario(
+        proj["ppa_price"],  # USD/kWh
+        proj["capex"],
+        fin["debt_pct"],
+        inv,
+        discount_rate=discount_rate,
+        tax_rate=tax_rate,
+    )
+
+
+_FINANCING_COLUMNS = ("financing_id", "tax_credit_pct", "debt_pct", "interest_rate", "term_years")
+
+# Statements are built once at import and reused by every call.
+_SEL_PROJECT_INPUTS = f"""
+    SELECT p.*, {", ".join(f"f.{col}" for col in _FINANCING_COLUMNS)}
+    FROM projects p
+    LEFT JOIN financing f ON f.project_id = p.project_id
+    WHERE p.project_id = {{pid}}
+    ORDER BY f.financing_id
+    LIMIT 1
+"""
+
+_INS_PROFORMA = text(
+    """
+    INSERT INTO proforma_results (
+        project_id, run_date, npv_real, irr_real, payback_year, max_dscr
+    )
+    VALUES (:pid, :run_date, :npv, :irr, :payback, :dscr)
+    """
+)
+
+
+def fetch_project_inputs(conn, project_id: int) -> tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Load a project and its financing terms in a single query.
+    """
+    row = execute_by_project_id(conn, _SEL_PROJECT_INPUTS, project_id).mappings().first()
+    if row is None:
+        raise ValueError(f"No project found with project_id={project_id}")
+    if row["financing_id"] is None:
+        raise ValueError(f"No financing found for project_id={project_id}")
+
+    proj = {k: v for k, v in row.items() if k not in _FINANCING_COLUMNS}
+    fin = {"project_id": project_id, **{k: row[k] for k in _FINANCING_COLUMNS}}
+    return proj, fin
+
+
+def run_project_model(project_id: int, conn=None) -> Dict[str, Any]:
     """
     Fetch project & financing from DB, run the model, and persist results.
+
+    Uses ``conn`` when given (e.g. shared across the CLI pipeline), otherwise
+    opens its own connection.
     """
     cfg = load_config() or {}
     model_cfg = cfg.get("model", {})
@@ -161,21 +246,8 @@ def run_project_model(project_id: int) -> Dict[str, Any]:
     years = model_cfg.get("project_life_years", 25)
     opex_escalation = model_cfg.get("opex_escalation", 0.02)
 
-    engine = get_engine()
-    with engine.connect() as conn:
-        proj = conn.execute(
-            text("SELECT * FROM projects WHERE project_id = :pid"),
-            {"pid": project_id},
-        ).mappings().first()
-        if proj is None:
-            raise ValueError(f"No project found with project_id={project_id}")
-
-        fin = conn.execute(
-            text("SELECT * FROM financing WHERE project_id = :pid"),
-            {"pid": project_id},
-        ).mappings().first()
-        if fin is None:
-            raise ValueError(f"No financing found for project_id={project_id}")
+    with connection_scope(conn) as conn:
+        proj, fin = fetch_project_inputs(conn, project_id)
 
         results = compute_project_finance(
             proj,
@@ -185,16 +257,12 @@ def run_project_model(project_id: int) -> Dict[str, Any]:
             years=years,
             opex_escalation=opex_escalation,
         )
+        # proforma_results.irr_real is NOT NULL; refuse to store a run without an IRR.
+        if isnan(results["irr"]):
+            raise ValueError(f"Levered cashflows for project_id={project_id} have no IRR")
 
         conn.execute(
-            text(
-                """
-                INSERT INTO proforma_results (
-                    project_id, run_date, npv_real, irr_real, payback_year, max_dscr
-                )
-                VALUES (:pid, :run_date, :npv, :irr, :payback, :dscr)
-                """
-            ),
+            _INS_PROFORMA,
             {
                 "pid": project_id,
                 "run_date": datetime.utcnow().isoformat(),
@@ -5,43 +5,36 @@ Generate a concise project summary from the latest pro forma results.
 import argparse
 from pathlib import Path
 
-from sqlalchemy import text
-
-from .database import get_engine
-
-
-def get_latest_result(project_id: int):
-    engine = get_engine()
-    with engine.connect() as conn:
-        proj = conn.execute(
-            text("SELECT * FROM projects WHERE project_id = :pid"),
-            {"pid": project_id},
-        ).mappings().first()
-
-        if proj is None:
-            raise ValueError(f"No project found with project_id={project_id}")
-
-        res = conn.execute(
-            text(
-                """
-                SELECT *
-                FROM proforma_results
-                WHERE project_id = :pid
-                ORDER BY run_date DESC
-                LIMIT 1
-                """
-            ),
-            {"pid": project_id},
-        ).mappings().first()
-
-        if res is None:
-            raise ValueError(f"No pro forma results found for project_id={project_id}")
+from .database import connection_scope, execute_by_project_id
 
+_RESULT_COLUMNS = ("result_id", "run_date", "npv_real", "irr_real", "payback_year", "max_dscr")
+
+_SEL_LATEST_RESULT = f"""
+    SELECT p.*, {", ".join(f"r.{col}" for col in _RESULT_COLUMNS)}
+    FROM projects p
+    LEFT JOIN proforma_results r ON r.project_id = p.project_id
+    WHERE p.project_id = {{pid}}
+    ORDER BY r.run_date DESC
+    LIMIT 1
+"""
+
+
+def get_latest_result(project_id: int, conn=None):
+    with connection_scope(conn) as conn:
+        row = execute_by_project_id(conn, _SEL_LATEST_RESULT, project_id).mappings().first()
+
+    if row is None:
+        raise ValueError(f"No project found with project_id={project_id}")
+    if row["result_id"] is None:
+        raise ValueError(f"No pro forma results found for project_id={project_id}")
+
+    proj = {k: v for k, v in row.items() if k not in _RESULT_COLUMNS}
+    res = {"project_id": project_id, **{k: row[k] for k in _RESULT_COLUMNS}}
     return proj, res
 
 
-def write_markdown_summary(project_id: int, output_dir: Path = Path("reports")) -> Path:
-    proj, res = get_latest_result(project_id)
+def write_markdown_summary(project_id: int, output_dir: Path = Path("reports"), conn=None) -> Path:
+    proj, res = get_latest_result(project_id, conn=conn)
 
     output_dir.mkdir(parents=True, exist_ok=True)
     out_path = output_dir / f"project_{project_id}_summary.md"
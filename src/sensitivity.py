@@ -1,20 +1,127 @@
 """
 Sensitivity analysis around PPA price, capex, and leverage.
 
-Writes results to reports/sensitivity_project_<id>.csv
+Writes results to reports/sensitivity_project_<id>.csv and the
+sensitivity_results table.
 """
 
 import argparse
 import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from math import isnan
 from pathlib import Path
 
 from sqlalchemy import text
 
-from .database import get_engine
-from .model import compute_project_finance, load_config
-
+from .database import connection_scope
+from .model import eval_scenario, fetch_project_inputs, load_config, precompute_invariants
+
+# Below this many scenarios, process start-up costs more than the sweep itself.
+PARALLEL_MIN_SCENARIOS = 500
+
+# Created on demand (not by db/create_db.py) so databases built from the
+# original schema, SQLite or Postgres, pick the table up without a rebuild.
+_CREATE_SENSITIVITY = """
+    CREATE TABLE IF NOT EXISTS sensitivity_results (
+        result_id       {pk},
+        project_id      INTEGER NOT NULL,
+        run_date        TEXT NOT NULL,
+        ppa_mult        REAL NOT NULL,
+        capex_mult      REAL NOT NULL,
+        debt_pct        REAL NOT NULL,
+        npv_real        REAL,
+        irr_real        REAL,
+        payback_year    REAL,
+        min_dscr        REAL,
+        FOREIGN KEY(project_id) REFERENCES projects(project_id)
+    )
+"""
 
-def run_sensitivity(project_id: int):
+_INS_SENSITIVITY = text(
+    """
+    INSERT INTO sensitivity_results (
+        project_id, run_date, ppa_mult, capex_mult, debt_pct,
+        npv_real, irr_real, payback_year, min_dscr
+    )
+    VALUES (:pid, :run_date, :ppa_mult, :capex_mult, :debt_pct,
+            :npv, :irr, :payback, :dscr)
+    """
+)
+
+
+def ensure_sensitivity_table(conn) -> None:
+    """
+    Create sensitivity_results if it does not exist; never touches other tables.
+    """
+    pk = "INTEGER PRIMARY KEY AUTOINCREMENT" if conn.dialect.name == "sqlite" else "SERIAL PRIMARY KEY"
+    conn.execute(text(_CREATE_SENSITIVITY.format(pk=pk)))
+
+
+def persist_sensitivity(project_id: int, results: list[dict], conn=None) -> None:
+    """
+    Store one sensitivity run in a single transaction (one executemany).
+    """
+    if not results:
+        return
+
+    run_date = datetime.utcnow().isoformat()
+    rows = [
+        {
+            "pid": project_id,
+            "run_date": run_date,
+            "ppa_mult": r["ppa_mult"],
+            "capex_mult": r["capex_mult"],
+            "debt_pct": r["debt_pct"],
+            "npv": r["npv"],
+            # No IRR (NaN) is stored as NULL on every backend.
+            "irr": None if isnan(r["irr"]) else r["irr"],
+            "payback": float(r["payback_year"]) if r["payback_year"] is not None else None,
+            "dscr": float(r["min_dscr"]) if r["min_dscr"] is not None else None,
+        }
+        for r in results
+    ]
+
+    with connection_scope(conn) as conn:
+        ensure_sensitivity_table(conn)
+        conn.execute(
+            _INS_SENSITIVITY,
+            rows,
+        )
+        conn.commit()
+
+
+def _run_scenario(task, base_ppa, base_capex, inv, model_kwargs):
+    """
+    Evaluate one (ppa multiplier, capex multiplier, debt %) scenario.
+    """
+    ppa_m, capex_m, debt_pct = task
+
+    out = eval_scenario(base_ppa * ppa_m, base_capex * capex_m, debt_pct, inv, **model_kwargs)
+
+    return {
+        "ppa_mult": ppa_m,
+        "capex_mult": capex_m,
+        "debt_pct": debt_pct,
+        "irr": out["irr"],
+        "npv": out["npv"],
+        "payback_year": out["payback_year"],
+        "min_dscr": out["min_dscr"],
+    }
+
+
+def run_sensitivity(project_id: int, max_workers: int | None = None, conn=None):
+    """
+    Run the PPA x capex x leverage sweep for a project.
+
+    Scenarios are spread over ``max_workers`` processes; pass 1 to run them
+    serially in this process. By default, sweeps of at least
+    PARALLEL_MIN_SCENARIOS scenarios use one process per CPU and smaller
+    ones run serially. Uses ``conn`` when given, otherwise opens its own.
+    """
     cfg = load_config() or {}
     model_cfg = cfg.get("model", {})
     discount_rate = model_cfg.get("discount_rate", 0.08)
@@ -22,59 +129,36 @@ def run_sensitivity(project_id: int):
     years = model_cfg.get("project_life_years", 25)
     opex_escalation = model_cfg.get("opex_escalation", 0.02)
 
-    engine = get_engine()
-    with engine.connect() as conn:
-        proj = conn.execute(
-            text("SELECT * FROM projects WHERE project_id = :pid"),
-            {"pid": project_id},
-        ).mappings().first()
-        fin = conn.execute(
-            text("SELECT * FROM financing WHERE project_id = :pid"),
-            {"pid": project_id},
-        ).mappings().first()
-
-        if proj is None or fin is None:
-            raise ValueError(f"Missing project or financing for project_id={project_id}")
-
-        base_ppa = proj["ppa_price"]
-        base_capex = proj["capex"]
-        base_debt = fin["debt_pct"]
-
-        ppa_mults = [0.90, 0.95, 1.00, 1.05, 1.10]
-        capex_mults = [0.90, 1.00, 1.10]
-        debt_levels = [max(0.0, base_debt - 0.10), base_debt, min(0.95, base_debt + 0.10)]
-
-        results = []
-        for ppa_m in ppa_mults:
-            for capex_m in capex_mults:
-                for debt_pct in debt_levels:
-                    temp_proj = dict(proj)
-                    temp_fin = dict(fin)
-
-                    temp_proj["ppa_price"] = base_ppa * ppa_m
-                    temp_proj["capex"] = base_capex * capex_m
-                    temp_fin["debt_pct"] = debt_pct
-
-                    out = compute_project_finance(
-                        temp_proj,
-                        temp_fin,
-                        discount_rate=discount_rate,
-                        tax_rate=tax_rate,
-                        years=years,
-                        opex_escalation=opex_escalation,
-                    )
-
-                    results.append(
-                        {
-                            "ppa_mult": ppa_m,
-                            "capex_mult": capex_m,
-                            "debt_pct": debt_pct,
-                            "irr": out["irr"],
-                            "npv": out["npv"],
-                            "payback_year": out["payback_year"],
-                            "min_dscr": out["min_dscr"],
-                        }
-                    )
+    with connection_scope(conn) as scoped:
+        proj, fin = fetch_project_inputs(scoped, project_id)
+
+    base_debt = fin["debt_pct"]
+
+    ppa_mults = [0.90, 0.95, 1.00, 1.05, 1.10]
+    capex_mults = [0.90, 1.00, 1.10]
+    debt_levels = [max(0.0, base_debt - 0.10), base_debt, min(0.95, base_debt + 0.10)]
+
+    tasks = list(itertools.product(ppa_mults, capex_mults, debt_levels))
+    # Everything except PPA price, capex, and leverage is shared by all scenarios.
+    inv = precompute_invariants(proj, fin, years, opex_escalation)
+    run_one = partial(
+        _run_scenario,
+        base_ppa=proj["ppa_price"],
+        base_capex=proj["capex"],
+        inv=inv,
+        model_kwargs={"discount_rate": discount_rate, "tax_rate": tax_rate},
+    )
+
+    if max_workers is None:
+        max_workers = os.cpu_count() if len(tasks) >= PARALLEL_MIN_SCENARIOS else 1
+    workers = min(max_workers or 1, len(tasks))
+    if workers <= 1:
+        results = [run_one(task) for task in tasks]
+    else:
+        # Scenarios are independent and CPU-bound; send each worker one chunk.
+        chunksize = -(-len(tasks) // workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_one, tasks, chunksize=chunksize))
 
     out_dir = Path("reports")
     out_dir.mkdir(parents=True, exist_ok=True)
@@ -83,13 +167,16 @@ def run_sensitivity(project_id: int):
     if results:
         keys = list(results[0].keys())
         with out_path.open("w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=keys)
-            writer.writeheader()
-            for r in results:
-                writer.writerow(r)
+            writer = csv.writer(f)
+            writer.writerow(keys)
+            # Every row dict is built with the same key order as the header.
+            writer.writerows(map(dict.values, results))
 
     print(f"Sensitivity results written to {out_path}")
 
+    # After the CSV, so a database failure cannot cost the report.
+    persist_sensitivity(project_id, results, conn=conn)
+
 
 def main():
     parser = argparse.ArgumentParser(description="Run sensitivity analysis for a project.")